@@ -1,9 +1,16 @@
 # api_client.py
 
-import requests
+import urllib3
 import os
 import json
 
+# Shared connection pool so repeated calls reuse the TCP connection
+HTTP = urllib3.PoolManager(
+    num_pools=1,
+    maxsize=10,
+    retries=urllib3.Retry(3, backoff_factor=0.3)
+)
+
 def main():
     # Define the API endpoint
     API_URL = "http://localhost:8000/scrape"
@@ -33,30 +40,35 @@ def main():
 
     # Make the POST request
     try:
-        response = requests.post(API_URL, json=payload, headers=headers)
-    except requests.exceptions.RequestException as e:
+        response = HTTP.request(
+            'POST',
+            API_URL,
+            body=json.dumps(payload).encode('utf-8'),
+            headers=headers
+        )
+    except urllib3.exceptions.HTTPError as e:
         print(f"Request failed: {e}")
         return
 
     # Handle the response
-    if response.status_code == 200:
+    if response.status == 200:
         try:
-            documents = response.json()
+            documents = json.loads(response.data)
             print("Scraped Documents:")
             for doc in documents:
                 print(f"URL: {doc['url']}\nContent: {doc['content'][:200]}...\n")
         except json.JSONDecodeError:
             print("Failed to decode JSON response.")
-    elif response.status_code == 401:
+    elif response.status == 401:
         print("Authentication Failed: Invalid API Key.")
-    elif response.status_code == 404:
+    elif response.status == 404:
         print("No relevant documents were extracted.")
     else:
         try:
-            error_detail = response.json().get('detail', 'No detail provided.')
+            error_detail = json.loads(response.data).get('detail', 'No detail provided.')
         except json.JSONDecodeError:
             error_detail = "No detail provided."
-        print(f"Error {response.status_code}: {error_detail}")
+        print(f"Error {response.status}: {error_detail}")
 
 if __name__ == "__main__":
     main()
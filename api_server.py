@@ -1,6 +1,7 @@
 # api_server.py
 
 from fastapi import FastAPI, HTTPException, Depends, Header
+from fastapi.responses import ORJSONResponse
 from pydantic import BaseModel
 from typing import List, Optional
 import os
@@ -10,7 +11,8 @@ from rufus import RufusClient
 app = FastAPI(
     title="Rufus API",
     description="API for Rufus Web Data Extraction Tool",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=ORJSONResponse
 )
 
 # Pydantic models for request and response
@@ -50,7 +52,8 @@ async def scrape_data(request: ScrapeRequest, api_key: str = Depends(get_api_key
         results = await client.scrape(request.base_url)
         if not results:
             raise HTTPException(status_code=404, detail="No relevant documents were extracted.")
-        return results
+        # Results are already plain dicts; returning the response directly skips re-validation
+        return ORJSONResponse(content=results)
     except ValueError as ve:
         raise HTTPException(status_code=400, detail=str(ve))
     except Exception as e:
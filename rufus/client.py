@@ -1,12 +1,27 @@
 # rufus/client.py
 
+import array
 import asyncio
 import logging
+import time
+from collections import defaultdict
 from urllib.parse import urljoin, urlparse
-from typing import List, Dict, Set, Optional
-from playwright.async_api import async_playwright, Page, Browser
-from bs4 import BeautifulSoup
-from .utils import compute_similarity, extract_keywords
+from typing import List, Dict, Set, Optional, Tuple
+import aiohttp
+import numpy as np
+from playwright.async_api import async_playwright, Page, Browser, BrowserContext, Route
+from playwright.async_api import TimeoutError as PlaywrightTimeoutError
+from selectolax.parser import HTMLParser
+from .utils import (
+    SimHashIndex,
+    canonicalize_url,
+    compile_keywords,
+    compute_relevance,
+    compute_simhash,
+    contains_keywords,
+    encode_instructions,
+    extract_keywords
+)
 import os
 
 # Configure logging
@@ -15,6 +30,32 @@ logging.basicConfig(
     format='%(asctime)s - %(levelname)s - %(message)s'
 )
 
+# Number of pages rendered concurrently
+MAX_PARALLEL_PAGES = 8
+# Number of concurrent requests allowed against a single host
+MAX_PAGES_PER_HOST = 2
+# Minimum number of seconds between the starts of two requests to the same host
+HOST_REQUEST_INTERVAL = 0.5
+# Custom User-Agent sent with every request
+USER_AGENT = "RufusCrawler/1.0 (+https://github.com/yourusername/rufus)"
+# Milliseconds to wait for client-side rendering to settle after the DOM is loaded
+RENDER_IDLE_TIMEOUT = 5000
+# Resource types the text-only scraper never uses; these requests are aborted
+BLOCKED_RESOURCE_TYPES = {"image", "media", "font", "stylesheet"}
+# Hosts whose stylesheets are still loaded (for JS-driven content that depends on CSS)
+STYLESHEET_ALLOWED_HOSTS: Set[str] = set()
+# Total number of open connections for plain HTTP fetches
+MAX_HTTP_CONNECTIONS = 50
+# Timeout in seconds for plain HTTP fetches
+HTTP_TIMEOUT = 20
+# Minimum length of <article>/<main> or paragraph text for a plain HTTP response
+# to count as server-rendered
+MIN_STATIC_TEXT_LENGTH = 2048
+# Prefixes of URLs the crawler follows
+VALID_URL_PREFIXES = ('http://', 'https://')
+# Number of page contents to accumulate before scoring them in one batch
+SCORE_BATCH_SIZE = 32
+
 class RufusClient:
     def __init__(
         self,
@@ -43,6 +84,8 @@ class RufusClient:
         self.similarity_threshold = similarity_threshold
         self.logger = logging.getLogger(self.__class__.__name__)
         self.browser: Browser = None
+        self.context: BrowserContext = None
+        self.http: aiohttp.ClientSession = None
 
         # If keywords are not provided, extract them from instructions
         if not self.keywords:
@@ -57,6 +100,10 @@ class RufusClient:
             self.logger.error("Invalid API Key provided.")
             raise ValueError("Invalid API Key.")
 
+        # The instructions are fixed for the client's lifetime, so encode them once
+        self.keyword_pattern = compile_keywords(self.keywords)
+        self.instruction_embedding = encode_instructions(self.instructions)
+
     def _authenticate(self) -> bool:
         """
         Authenticates the provided API key.
@@ -81,7 +128,8 @@ class RufusClient:
         :return: A list of extracted documents.
         """
         # Reset internal state
-        self.visited_urls: Set[str] = set()
+        # Hashes of canonical URLs; much smaller than keeping the URL strings
+        self.visited_urls: Set[int] = set()
         self.results: List[Dict[str, str]] = []
         self.logger.debug("Internal state reset for new scrape operation.")
 
@@ -100,22 +148,70 @@ class RufusClient:
         async with async_playwright() as p:
             self.browser = await p.chromium.launch(headless=True)
             self.logger.debug(f"Browser launched.")
-            await self._crawl(base_url, depth=0)
+            self.context = await self.browser.new_context(user_agent=USER_AGENT)
+            await self.context.route("**/*", self._route_request)
+            # Pre-warm one page per worker so pages are reused instead of created per URL
+            self.page_pool: asyncio.Queue = asyncio.Queue()
+            for _ in range(MAX_PARALLEL_PAGES):
+                self.page_pool.put_nowait(await self.context.new_page())
+            async with aiohttp.ClientSession(
+                headers={"User-Agent": USER_AGENT},
+                connector=aiohttp.TCPConnector(limit=MAX_HTTP_CONNECTIONS),
+                timeout=aiohttp.ClientTimeout(total=HTTP_TIMEOUT)
+            ) as self.http:
+                await self._crawl(base_url)
+            await self.context.close()
             await self.browser.close()
             self.logger.debug(f"Browser closed.")
         return self.results
 
-    async def _crawl(self, url: str, depth: int):
+    async def _crawl(self, base_url: str):
+        """
+        Crawls the website breadth-first using a bounded pool of workers.
+
+        :param base_url: The URL to start crawling from.
+        """
+        # The frontier is stored as parallel arrays indexed by URL id; the queue carries only ids
+        self.frontier_urls: List[Optional[str]] = []
+        self.frontier_depths = array.array('H')
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self.host_semaphores: Dict[str, asyncio.Semaphore] = defaultdict(
+            lambda: asyncio.Semaphore(MAX_PAGES_PER_HOST)
+        )
+        self.host_next_request: Dict[str, float] = {}
+        self.pending_pages: List[Tuple[str, str]] = []
+        self.simhash_index = SimHashIndex()
+
+        self._enqueue(base_url, depth=0)
+        workers = [asyncio.create_task(self._worker()) for _ in range(MAX_PARALLEL_PAGES)]
+        await self.queue.join()
+        for worker in workers:
+            worker.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+
+        # Score whatever is left over from the last partial batch
+        await self._flush_pending_pages()
+
+    def _enqueue(self, url: str, depth: int):
         """
-        Recursively crawls the website.
+        Adds a URL to the crawl queue unless it was already seen or a limit is reached.
 
         :param url: The URL to crawl.
-        :param depth: The current depth of crawling.
+        :param depth: The depth at which the URL was found.
         """
         if depth > self.max_depth:
             self.logger.debug(f"Max depth {self.max_depth} reached at URL: {url}")
             return
-        if url in self.visited_urls:
+        # The canonical form is only used to detect variants of the same page; the
+        # URL that is fetched and reported is the one the site linked to
+        url = url.split('#', 1)[0]
+        try:
+            url_hash = hash(canonicalize_url(url))
+        except ValueError as e:
+            self.logger.debug(f"Ignored malformed URL {url}: {e}")
+            return
+        # No await between the check and the add, so no lock is needed across workers
+        if url_hash in self.visited_urls:
             self.logger.debug(f"Already visited URL: {url}")
             return
         if len(self.visited_urls) >= self.max_pages:
@@ -124,45 +220,162 @@ class RufusClient:
 
         # **Removed robots.txt compliance check**
 
-        self.visited_urls.add(url)
-        self.logger.info(f"Crawling URL: {url} at depth {depth}")
+        self.visited_urls.add(url_hash)
+        self.frontier_urls.append(url)
+        self.frontier_depths.append(depth)
+        self.queue.put_nowait(len(self.frontier_urls) - 1)
 
+    async def _worker(self):
+        """
+        Consumes URLs from the crawl queue until cancelled.
+        """
+        while True:
+            url_id = await self.queue.get()
+            url, depth = self.frontier_urls[url_id], self.frontier_depths[url_id]
+            # The URL string is no longer needed once taken; the visited hash remains
+            self.frontier_urls[url_id] = None
+            try:
+                await self._crawl_page(url, depth)
+            except Exception as e:
+                # Keep the worker alive; a dead worker would leave queue.join() waiting forever
+                self.logger.error(f"Unexpected error crawling URL {url}: {e}")
+            finally:
+                self.queue.task_done()
+
+    async def _crawl_page(self, url: str, depth: int):
+        """
+        Renders a single page, queues its content for scoring and enqueues its links.
+
+        :param url: The URL to crawl.
+        :param depth: The current depth of crawling.
+        """
+        self.logger.info(f"Crawling URL: {url} at depth {depth}")
         try:
-            html = await self._render_page(url)
-            content = self._extract_content(html)
-            if content:
-                is_relevant = compute_similarity(
-                    content,
-                    self.instructions,
-                    self.keywords,
-                    self.similarity_threshold
-                )
-                self.logger.debug(f"Similarity score for URL {url}: {is_relevant}")
-                if is_relevant:
-                    self.results.append({
-                        "url": url,
-                        "content": content
-                    })
-                    self.logger.info(f"Relevant content found at URL: {url}")
+            host = urlparse(url).netloc
+            async with self.host_semaphores[host]:
+                await self._wait_for_host(host)
+                # The parsed tree is shared between both extractors
+                tree = await self._fetch_page(url)
+            content = self._extract_content(tree)
+            # Empty pages and near-duplicates are dropped without scoring or following their links
+            if not content:
+                return
+            if not self.simhash_index.add_if_new(compute_simhash(content)):
+                self.logger.debug(f"Skipping near-duplicate content at URL: {url}")
+                return
+            # Links found at max depth would all be rejected by _enqueue
+            links = self._extract_links(tree, url) if depth < self.max_depth else []
         except Exception as e:
             self.logger.error(f"Error processing URL {url}: {e}")
+            return
+
+        self.pending_pages.append((url, content))
+        if len(self.pending_pages) >= SCORE_BATCH_SIZE:
+            await self._flush_pending_pages()
 
-        # Find and crawl links
-        links = self._extract_links(html, url)
         self.logger.debug(f"Found {len(links)} links on URL: {url}")
+        for link in links:
+            self._enqueue(link, depth + 1)
 
-        # Introduce a delay to respect the target server
-        await asyncio.sleep(1)  # 1-second delay; adjust as needed
+    async def _wait_for_host(self, host: str):
+        """
+        Waits until the next request slot for the host, keeping requests to the
+        same host HOST_REQUEST_INTERVAL apart while other hosts proceed freely.
 
-        tasks = []
-        for link in links:
-            if len(self.visited_urls) >= self.max_pages:
-                self.logger.debug(f"Max pages {self.max_pages} reached during link extraction.")
-                break
-            tasks.append(self._crawl(link, depth + 1))
-        
-        if tasks:
-            await asyncio.gather(*tasks)
+        :param host: The host about to be requested.
+        """
+        now = time.monotonic()
+        # Reserve the slot before sleeping so concurrent workers queue up behind it
+        slot = max(now, self.host_next_request.get(host, now))
+        self.host_next_request[host] = slot + HOST_REQUEST_INTERVAL
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+    async def _flush_pending_pages(self):
+        """
+        Scores all pages waiting in the pending buffer and clears it.
+        """
+        # Take the batch before awaiting so other workers keep buffering into a fresh list
+        pages, self.pending_pages = self.pending_pages, []
+        await self._score_pages(pages)
+
+    async def _score_pages(self, pages: List[Tuple[str, str]]):
+        """
+        Scores a batch of pages against the instructions and stores the relevant ones.
+
+        :param pages: A list of (url, content) pairs.
+        """
+        if not pages:
+            return
+        contents = [content for _, content in pages]
+        # The encode is a long blocking forward pass; run it off the event loop so the
+        # other workers keep rendering and fetching meanwhile
+        loop = asyncio.get_running_loop()
+        relevant = await loop.run_in_executor(
+            None,
+            compute_relevance,
+            contents,
+            self.instruction_embedding,
+            self.similarity_threshold
+        )
+        # Only pages above the similarity threshold go on to the keyword check
+        for index in np.flatnonzero(relevant):
+            url, content = pages[index]
+            self.logger.debug(f"Similarity above threshold for URL {url}")
+            if contains_keywords(content, self.keyword_pattern):
+                self.results.append({
+                    "url": url,
+                    "content": content
+                })
+                self.logger.info(f"Relevant content found at URL: {url}")
+
+    async def _fetch_page(self, url: str) -> HTMLParser:
+        """
+        Retrieves and parses a page, using a plain HTTP request when the page is
+        server-rendered and falling back to rendering it in the browser otherwise.
+
+        :param url: The URL to fetch.
+        :return: The parsed HTML of the page.
+        """
+        tree = await self._fetch_static_page(url)
+        if tree is not None:
+            return tree
+        return HTMLParser(await self._render_page(url))
+
+    async def _fetch_static_page(self, url: str) -> Optional[HTMLParser]:
+        """
+        Fetches the page over plain HTTP and checks whether it is usable without rendering.
+
+        :param url: The URL to fetch.
+        :return: The parsed HTML (empty for non-HTML responses), or None if the page needs the browser.
+        """
+        try:
+            async with self.http.get(url) as response:
+                if response.status != 200:
+                    self.logger.debug(f"HTTP status {response.status} for URL {url}; falling back to browser.")
+                    return None
+                content_type = response.headers.get('Content-Type')
+                if not content_type:
+                    self.logger.debug(f"No Content-Type for URL {url}; falling back to browser.")
+                    return None
+                if not content_type.startswith('text/html'):
+                    self.logger.debug(f"Skipping non-HTML content at URL: {url}")
+                    return HTMLParser("")
+                html = await response.text()
+        except Exception as e:
+            self.logger.debug(f"HTTP fetch failed for URL {url}: {e}; falling back to browser.")
+            return None
+
+        tree = HTMLParser(html)
+        # An empty <main id="app"></main> SPA shell must not count, so require real text
+        has_main_text = any(
+            len(node.text(strip=True)) > MIN_STATIC_TEXT_LENGTH for node in tree.css('article, main')
+        )
+        if has_main_text or sum(len(node.text(strip=True)) for node in tree.css('p')) > MIN_STATIC_TEXT_LENGTH:
+            self.logger.debug(f"Page content retrieved over HTTP for URL: {url}")
+            return tree
+        self.logger.debug(f"Page at URL {url} looks client-rendered; falling back to browser.")
+        return None
 
     async def _render_page(self, url: str) -> str:
         """
@@ -171,79 +384,102 @@ class RufusClient:
         :param url: The URL to render.
         :return: The HTML content of the page.
         """
-        if not self.browser:
+        if not self.context:
             self.logger.error("Browser is not initialized.")
             return ""
-        page: Page = await self.browser.new_page()
-        # Set a custom User-Agent
-        await page.set_extra_http_headers({
-            "User-Agent": "RufusCrawler/1.0 (+https://github.com/yourusername/rufus)"
-        })
+        page: Page = await self.page_pool.get()
         self.logger.debug(f"Navigating to URL: {url}")
         try:
-            await page.goto(url, timeout=60000)  # 60 seconds timeout
-            await page.wait_for_load_state('networkidle')  # Wait until network is idle
+            await page.goto(url, wait_until='domcontentloaded', timeout=30000)  # 30 seconds timeout
+            # Only client-rendered pages reach the browser, and their content usually
+            # arrives after the DOM is loaded. Give it a short while to settle, but
+            # don't let long-polling or trackers hold the page up.
+            try:
+                await page.wait_for_load_state('networkidle', timeout=RENDER_IDLE_TIMEOUT)
+            except PlaywrightTimeoutError:
+                self.logger.debug(f"Network not idle after {RENDER_IDLE_TIMEOUT} ms for URL: {url}")
             html = await page.content()
             self.logger.debug(f"Page content retrieved for URL: {url}")
         except Exception as e:
             self.logger.error(f"Error rendering page {url}: {e}")
             html = ""
-        await page.close()
+            # The page may have crashed or been closed; don't hand it to the next URL
+            page = await self._replace_page(page)
+        finally:
+            self.page_pool.put_nowait(page)
         return html
 
-    def _extract_content(self, html: str) -> str:
+    async def _replace_page(self, page: Page) -> Page:
+        """
+        Closes a page that failed to render and opens a fresh one for the page pool.
+
+        :param page: The page that failed.
+        :return: The new page, or the old one if a new page could not be opened.
         """
-        Extracts and cleans text content from HTML.
+        try:
+            if not page.is_closed():
+                await page.close()
+        except Exception as e:
+            self.logger.debug(f"Error closing failed page: {e}")
+        try:
+            return await self.context.new_page()
+        except Exception as e:
+            self.logger.error(f"Could not open a replacement page: {e}")
+            return page
+
+    async def _route_request(self, route: Route):
+        """
+        Aborts requests for resources that do not contribute to the page text.
+
+        :param route: The intercepted Playwright route.
+        """
+        request = route.request
+        resource_type = request.resource_type
+        if resource_type in BLOCKED_RESOURCE_TYPES and not (
+            resource_type == "stylesheet" and urlparse(request.url).hostname in STYLESHEET_ALLOWED_HOSTS
+        ):
+            await route.abort()
+        else:
+            await route.continue_()
+
+    def _extract_content(self, tree: HTMLParser) -> str:
+        """
+        Extracts and cleans text content from a parsed HTML page.
 
-        :param html: The HTML content of the page.
+        :param tree: The parsed HTML of the page.
         :return: The extracted text content.
         """
-        soup = BeautifulSoup(html, 'html.parser')
-        content = soup.get_text(separator=' ', strip=True)
+        content = tree.body.text(separator=' ', strip=True) if tree.body else ''
         if content:
             self.logger.debug(f"Extracted content length: {len(content)} characters")
             # Add a snippet of the content for verification
             snippet = content[:200] + '...' if len(content) > 200 else content
             self.logger.debug(f"Content snippet: {snippet}")
-            print(f"Extracted content from URL: {snippet}")  # Added print statement for immediate verification
             return content
         else:
             self.logger.warning("No content extracted from the page.")
             return ""
 
-    def _extract_links(self, html: str, current_url: str) -> List[str]:
+    def _extract_links(self, tree: HTMLParser, current_url: str) -> List[str]:
         """
-        Extracts all valid links from the HTML content.
+        Extracts all valid links from a parsed HTML page.
 
-        :param html: The HTML content of the page.
+        :param tree: The parsed HTML of the page.
         :param current_url: The URL of the current page.
         :return: A list of valid URLs to crawl.
         """
-        soup = BeautifulSoup(html, 'html.parser')
         links = set()
-        for a_tag in soup.find_all('a', href=True):
-            href = a_tag['href']
-            parsed_href = urlparse(href)
-            if parsed_href.scheme in ['http', 'https']:
-                full_url = href
-            else:
-                full_url = urljoin(current_url, href)
-            if self._is_valid_url(full_url):
+        for node in tree.css('a[href]'):
+            href = node.attributes.get('href')
+            if not href:
+                continue
+            # Absolute links are used as-is; relative ones are resolved against the page.
+            # Only HTTP(S) links are kept, which drops mailto:, javascript: and the like
+            # Schemes are case-insensitive, so only the prefix is lowercased for the test
+            full_url = href if href[:8].lower().startswith(VALID_URL_PREFIXES) else urljoin(current_url, href)
+            if full_url[:8].lower().startswith(VALID_URL_PREFIXES):
                 links.add(full_url)
         self.logger.debug(f"Total valid links extracted: {len(links)}")
         return list(links)
 
-    def _is_valid_url(self, url: str) -> bool:
-        """
-        Checks if the URL is valid (i.e., uses HTTP or HTTPS scheme).
-
-        :param url: The URL to check.
-        :return: True if valid, False otherwise.
-        """
-        parsed_url = urlparse(url)
-        is_valid = parsed_url.scheme in ['http', 'https']
-        if not is_valid:
-            self.logger.debug(f"Ignored invalid URL scheme: {url}")
-        return is_valid
-
    
\ No newline at end of file
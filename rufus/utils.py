@@ -1,17 +1,16 @@
 # rufus/utils.py
 
-from typing import List, Optional
+from typing import Dict, List, Optional, Pattern, Set
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
 from sentence_transformers import SentenceTransformer
-from sklearn.metrics.pairwise import cosine_similarity
+import numpy as np
+import torch
 import logging
+import re
 import nltk
 from nltk.corpus import stopwords
-from nltk.tokenize import word_tokenize
-from collections import Counter
-
-# Ensure required NLTK data packages are downloaded
-nltk.download('punkt')
-nltk.download('stopwords')
+from collections import Counter, defaultdict
+from functools import lru_cache
 
 # Configure logging
 logging.basicConfig(
@@ -21,11 +20,53 @@ logging.basicConfig(
 
 logger = logging.getLogger(__name__)
 
+def _load_stopwords() -> frozenset:
+    """
+    Loads the English NLTK stopwords, downloading them only if they are not installed yet.
+    Falls back to an empty set when they cannot be obtained (e.g. offline), so that
+    importing Rufus never fails; keyword extraction then simply keeps stopwords.
+
+    :return: The set of English stopwords.
+    """
+    try:
+        nltk.data.find('corpora/stopwords')
+    except LookupError:
+        if not nltk.download('stopwords', quiet=True):
+            logger.warning("NLTK stopwords could not be downloaded; stopwords will not be filtered.")
+            return frozenset()
+    try:
+        return frozenset(stopwords.words('english'))
+    except LookupError as e:
+        logger.warning(f"NLTK stopwords could not be loaded; stopwords will not be filtered: {e}")
+        return frozenset()
+
+STOPWORDS = _load_stopwords()
+
+# Run the model on the GPU when one is available
+DEVICE = 'cuda' if torch.cuda.is_available() else 'cpu'
+# Larger batches keep the GPU busy; on CPU they only add padding overhead
+ENCODE_BATCH_SIZE = 64 if DEVICE == 'cuda' else 32
+
 # Initialize the model once
-logger.debug("Loading SentenceTransformer model.")
-model = SentenceTransformer('all-MiniLM-L6-v2')
+logger.debug(f"Loading SentenceTransformer model on {DEVICE}.")
+model = SentenceTransformer('all-MiniLM-L6-v2', device=DEVICE)
 logger.debug("Model loaded successfully.")
 
+# Use FP16 on the GPU and quantize the Linear layers to INT8 on CPU; the small
+# accuracy loss does not matter for a thresholded similarity test
+if DEVICE == 'cuda':
+    model.half()
+    logger.debug("Model converted to FP16.")
+else:
+    try:
+        torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+        logger.debug("Model quantized to INT8.")
+    except Exception as e:
+        logger.warning(f"Model quantization failed, using FP32: {e}")
+
+# Alphabetic words of at least two letters in lowercased text
+TOKEN_RE = re.compile(r'[a-z]{2,}')
+
 def extract_keywords(instructions: str, num_keywords: int = 5) -> List[str]:
     """
     Extracts keywords from the user instructions using NLP techniques.
@@ -35,13 +76,12 @@ def extract_keywords(instructions: str, num_keywords: int = 5) -> List[str]:
     :return: A list of extracted keywords.
     """
     try:
-        # Tokenize the instructions
-        tokens = word_tokenize(instructions.lower())
+        # Tokenize the instructions into alphabetic words
+        tokens = TOKEN_RE.findall(instructions.lower())
         logger.debug(f"Tokenized instructions: {tokens}")
         
-        # Remove stopwords and non-alphabetic tokens
-        stop_words = set(stopwords.words('english'))
-        filtered_tokens = [word for word in tokens if word.isalpha() and word not in stop_words]
+        # Remove stopwords
+        filtered_tokens = [word for word in tokens if word not in STOPWORDS]
         logger.debug(f"Filtered tokens: {filtered_tokens}")
         
         # Count word frequencies
@@ -58,32 +98,166 @@ def extract_keywords(instructions: str, num_keywords: int = 5) -> List[str]:
         logger.error(f"Error extracting keywords: {e}")
         return []
 
-def compute_similarity(content: str, instructions: str, keywords: Optional[List[str]] = None, threshold: float = 0.5) -> bool:
+def encode_texts(texts) -> torch.Tensor:
     """
-    Compute the similarity between the content and instructions.
-    Returns True if similarity is above the threshold and contains relevant keywords.
+    Encodes one or more texts into L2-normalized embeddings kept on the model's device.
+
+    :param texts: A single string or a list of strings to encode.
+    :return: A 1-D embedding for a string, or a 2-D tensor of embeddings for a list.
+    """
+    with torch.inference_mode():
+        return model.encode(
+            texts,
+            batch_size=ENCODE_BATCH_SIZE,
+            normalize_embeddings=True,
+            convert_to_tensor=True,
+            show_progress_bar=False
+        )
+
+@lru_cache(maxsize=128)
+def encode_instructions(instructions: str) -> torch.Tensor:
+    """
+    Encodes user instructions, caching the embedding so that clients created
+    with the same instructions (e.g. repeated API requests) do not re-encode them.
 
-    :param content: Extracted text content from a webpage.
     :param instructions: User-defined instructions for relevance.
-    :param keywords: List of relevant keywords.
+    :return: The normalized instruction embedding.
+    """
+    return encode_texts(instructions)
+
+def compute_relevance(contents: List[str], instruction_embedding: torch.Tensor, threshold: float = 0.5) -> np.ndarray:
+    """
+    Compute which contents are similar enough to the instructions, in a single batch.
+    Embeddings are normalized, so the dot product equals the cosine similarity.
+
+    :param contents: Extracted text contents from webpages.
+    :param instruction_embedding: Normalized embedding of the user-defined instructions.
     :param threshold: Similarity threshold for relevance.
-    :return: Boolean indicating if content is relevant.
+    :return: Boolean array, True where the similarity is above the threshold.
     """
     try:
-        embeddings = model.encode([instructions, content])
-        similarity = cosine_similarity([embeddings[0]], [embeddings[1]])[0][0]
-        logger.debug(f"Computed similarity: {similarity}")
-        
-        if keywords:
-            content_lower = content.lower()
-            has_keywords = any(keyword.lower() in content_lower for keyword in keywords)
-            logger.debug(f"Contains relevant keywords: {has_keywords}")
-        else:
-            # If no keywords are provided, consider it as True (since keywords are optional)
-            has_keywords = True
-            logger.debug("No keywords provided; bypassing keyword check.")
-        
-        return similarity > threshold and has_keywords
+        embeddings = encode_texts(contents)
+        # Threshold on the model's device so only the boolean mask is copied back
+        with torch.inference_mode():
+            mask = ((embeddings @ instruction_embedding) > threshold).cpu().numpy()
+        logger.debug(f"{int(mask.sum())} of {len(contents)} contents above similarity threshold")
+        return mask
     except Exception as e:
-        logger.error(f"Error computing similarity: {e}")
-        return False
+        logger.error(f"Error computing similarities: {e}")
+        return np.zeros(len(contents), dtype=bool)
+
+def compile_keywords(keywords: Optional[List[str]] = None) -> Optional[Pattern]:
+    """
+    Compiles the keywords into a single pattern matching any of them,
+    so the content is scanned once regardless of the number of keywords.
+
+    :param keywords: List of relevant keywords.
+    :return: The compiled pattern, or None if no keywords are provided.
+    """
+    if not keywords:
+        return None
+    return re.compile('|'.join(re.escape(keyword.lower()) for keyword in keywords))
+
+def contains_keywords(content: str, keyword_pattern: Optional[Pattern] = None) -> bool:
+    """
+    Checks whether the content contains any of the relevant keywords.
+
+    :param content: Extracted text content from a webpage.
+    :param keyword_pattern: Pattern built by compile_keywords.
+    :return: True if any keyword is present or no keywords are provided.
+    """
+    if keyword_pattern is None:
+        # If no keywords are provided, consider it as True (since keywords are optional)
+        logger.debug("No keywords provided; bypassing keyword check.")
+        return True
+    has_keywords = keyword_pattern.search(content.lower()) is not None
+    logger.debug(f"Contains relevant keywords: {has_keywords}")
+    return has_keywords
+
+# Query parameters that do not change page content; utm_* parameters are dropped as well
+IGNORED_QUERY_PARAMS = {'sessionid', 'sort', 'view'}
+
+def canonicalize_url(url: str) -> str:
+    """
+    Canonicalizes a URL so that variants of the same page compare equal.
+    Lowercases the scheme and host, drops the fragment and tracking parameters,
+    and sorts the remaining query parameters.
+
+    :param url: The URL to canonicalize.
+    :return: The canonical URL.
+    """
+    parts = urlsplit(url)
+    query = sorted(
+        (key, value)
+        for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not key.lower().startswith('utm_') and key.lower() not in IGNORED_QUERY_PARAMS
+    )
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path or '/', urlencode(query), ''))
+
+# Number of words per shingle when fingerprinting page content
+SHINGLE_SIZE = 8
+# Pages whose SimHash fingerprints differ in at most this many bits are near-duplicates
+MAX_DUPLICATE_DISTANCE = 3
+# Number of bands the 64-bit fingerprint is split into for indexing; with more
+# bands than MAX_DUPLICATE_DISTANCE, near-duplicates always share at least one band
+SIMHASH_BANDS = 4
+DIGITS_RE = re.compile(r'\d+')
+
+def compute_simhash(content: str) -> int:
+    """
+    Computes a 64-bit SimHash fingerprint of the content.
+    Digits are stripped so that pages differing only in counters, dates or ids collide.
+
+    :param content: Extracted text content from a webpage.
+    :return: The 64-bit fingerprint.
+    """
+    tokens = DIGITS_RE.sub('', content).lower().split()
+    if not tokens:
+        return 0
+    shingles = [
+        ' '.join(tokens[i:i + SHINGLE_SIZE])
+        for i in range(max(len(tokens) - SHINGLE_SIZE + 1, 1))
+    ]
+    # hash() is salted per process, which is fine since fingerprints never outlive a crawl
+    hashes = np.fromiter(
+        (hash(shingle) & 0xFFFFFFFFFFFFFFFF for shingle in shingles),
+        dtype=np.uint64,
+        count=len(shingles)
+    )
+    bits = np.unpackbits(hashes.view(np.uint8)).reshape(-1, 64)
+    # A fingerprint bit is set when the majority of shingle hashes have it set
+    majority = bits.sum(axis=0) * 2 > len(shingles)
+    return int.from_bytes(np.packbits(majority).tobytes(), 'big')
+
+class SimHashIndex:
+    """
+    Index of SimHash fingerprints supporting near-duplicate lookups.
+    Fingerprints are bucketed by each of their bands so that only candidates
+    sharing a band have their Hamming distance checked.
+    """
+
+    def __init__(self):
+        self.fingerprints: Set[int] = set()
+        band_bits = 64 // SIMHASH_BANDS
+        self.band_shifts = [band * band_bits for band in range(SIMHASH_BANDS)]
+        self.band_mask = (1 << band_bits) - 1
+        self.bands: List[Dict[int, List[int]]] = [defaultdict(list) for _ in range(SIMHASH_BANDS)]
+
+    def add_if_new(self, fingerprint: int) -> bool:
+        """
+        Adds the fingerprint unless a near-duplicate is already indexed.
+
+        :param fingerprint: The SimHash fingerprint of a page.
+        :return: True if the fingerprint was added, False if it is a near-duplicate.
+        """
+        if fingerprint in self.fingerprints:
+            return False
+        keys = [(fingerprint >> shift) & self.band_mask for shift in self.band_shifts]
+        for band, key in zip(self.bands, keys):
+            for candidate in band.get(key, ()):
+                if bin(fingerprint ^ candidate).count('1') <= MAX_DUPLICATE_DISTANCE:
+                    return False
+        self.fingerprints.add(fingerprint)
+        for band, key in zip(self.bands, keys):
+            band[key].append(fingerprint)
+        return True
@@ -1,8 +1,8 @@
 # run_rufus.py
 
 import asyncio
-import json
 import logging
+import orjson
 from datetime import datetime
 from rufus import RufusClient
 import os
@@ -69,8 +69,8 @@ async def main():
 
         # Save the results to a JSON file
         try:
-            with open(output_filename, 'w', encoding='utf-8') as f:
-                json.dump(results, f, ensure_ascii=False, indent=2)
+            with open(output_filename, 'wb') as f:
+                f.write(orjson.dumps(results, option=orjson.OPT_INDENT_2))
             logging.info(f"Results successfully saved to {output_filename}")
             print(f"Results successfully saved to {output_filename}")
         except Exception as e:
@@ -78,7 +78,7 @@ async def main():
             print(f"Error: Failed to save results to {output_filename}.")
 
         # Optionally, print the results to the terminal
-        print(json.dumps(results, indent=2))
+        print(orjson.dumps(results, option=orjson.OPT_INDENT_2).decode())
 
 if __name__ == "__main__":
     asyncio.run(main())
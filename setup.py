@@ -9,7 +9,7 @@ setup(
     install_requires=[
         'aiohttp==3.10.10',
         'aiodns==3.2.0',
-        'beautifulsoup4==4.12.3',
+        'selectolax==0.3.21',
         'tqdm==4.66.5',
         'playwright==1.48.0',
         'sentence-transformers==3.2.1',
@@ -20,6 +20,7 @@ setup(
         'spacy==3.8.2',
         'fastapi==0.115.3',
         'uvicorn==0.32.0',
+        'orjson==3.10.10',
         'nltk==3.8.1'
     ],
     author='Pranav Saji',